@@ -6,7 +6,13 @@
 
 # Copyright (c) 2021 scart97
 
-__all__ = ["convolution_stft", "get_same_padding", "conv1d_decoder"]
+__all__ = [
+    "convolution_stft",
+    "get_same_padding",
+    "conv1d_decoder",
+    "Conv1dChannelsLast",
+    "convert_to_channels_last",
+]
 
 import math
 
@@ -77,6 +83,8 @@ def convolution_stft(
     cutoff = int((n_fft / 2) + 1)
     real_part = forward_transform[:, :cutoff, :]
     imag_part = forward_transform[:, cutoff:, :]
+    if return_complex:
+        return torch.complex(real_part, imag_part)
     return torch.stack((real_part, imag_part), dim=-1)
 
 
@@ -126,6 +134,74 @@ def conv1d_decoder(decoder_input_channels: int, num_classes: int) -> nn.Module:
     return decoder
 
 
+class Conv1dChannelsLast(nn.Conv2d):
+    """Conv1d implemented as a Conv2d over inputs of shape (batch, channels, 1, time)
+    using the channels_last memory format. This lets cuDNN pick the faster NHWC kernels,
+    specially for depthwise convolutions in fp16. The math is the same as the original
+    Conv1d, and input/output are still tensors of shape (batch, channels, time).
+    """
+
+    @classmethod
+    def from_conv1d(cls, conv: nn.Conv1d) -> "Conv1dChannelsLast":
+        """Creates the layer with the same parameters and weights of a Conv1d.
+
+        Args:
+            conv : Original convolution
+
+        Returns:
+            Equivalent layer using the channels_last memory format.
+        """
+        # "same" and "valid" paddings behave the same over the dummy dimension
+        padding = conv.padding
+        if not isinstance(padding, str):
+            padding = (0, padding[0])
+        layer = cls(
+            conv.in_channels,
+            conv.out_channels,
+            kernel_size=(1, conv.kernel_size[0]),
+            stride=(1, conv.stride[0]),
+            padding=padding,
+            dilation=(1, conv.dilation[0]),
+            groups=conv.groups,
+            bias=conv.bias is not None,
+            padding_mode=conv.padding_mode,
+        )
+        with torch.no_grad():
+            layer.weight.copy_(conv.weight.unsqueeze(2))
+            if conv.bias is not None:
+                layer.bias.copy_(conv.bias)
+        return layer.to(
+            device=conv.weight.device,
+            dtype=conv.weight.dtype,
+            memory_format=torch.channels_last,
+        )
+
+    def forward(self, x: Tensor) -> Tensor:
+        x = x.unsqueeze(2).contiguous(memory_format=torch.channels_last)
+        return self._conv_forward(x, self.weight, self.bias).squeeze(2)
+
+
+def convert_to_channels_last(model: nn.Module) -> nn.Module:
+    """Replace all the Conv1d layers inside the model with
+    [`Conv1dChannelsLast`][thunder.blocks.Conv1dChannelsLast].
+    Useful to speed up inference of convolution heavy models, like citrinet,
+    when running on cuda with fp16. Apply it after loading the weights,
+    because the converted layers have different weight shapes.
+
+    Args:
+        model : Model to be converted. The operation occurs inplace.
+
+    Returns:
+        The same model, with the layers replaced.
+    """
+    for name, module in model.named_children():
+        if isinstance(module, nn.Conv1d):
+            setattr(model, name, Conv1dChannelsLast.from_conv1d(module))
+        else:
+            convert_to_channels_last(module)
+    return model
+
+
 class SwapLastDimension(nn.Module):
     """Layer that swap the last two dimensions of the data."""
 
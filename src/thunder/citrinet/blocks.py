@@ -29,22 +29,86 @@ __all__ = [
     "stem",
     "body",
     "Citrinet_encoder",
+    "fuse_encoder",
+    "optimize_encoder",
+    "quantize_encoder",
 ]
 
+from copy import deepcopy
 from dataclasses import dataclass
-from typing import List
+from typing import Iterable, List
 
 import torch
 from torch import nn
 from torch.nn.common_types import _size_1_t
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from torch.quantization import (
+    QuantWrapper,
+    convert,
+    fuse_modules,
+    get_default_qconfig,
+    prepare,
+)
 
 from thunder.quartznet.blocks import (
+    MaskedBatchNorm1d,
     _get_act_dropout_layer,
     _get_conv_bn_layer,
     get_same_padding,
 )
 
 
+def _fuse_conv_bn_sequential(layers: nn.Sequential):
+    """Fuse every convolution followed by batchnorm inside the sequential.
+    The batchnorm is replaced by an identity, so that the layer indexes are kept.
+    There's no return, the operation occurs inplace.
+
+    Args:
+        layers: Sequential containing the layers to be fused. Should be in eval mode.
+    """
+    for i in range(len(layers) - 1):
+        conv, bn = layers[i], layers[i + 1]
+        if isinstance(bn, MaskedBatchNorm1d):
+            bn = bn.layer
+        if isinstance(conv, nn.Conv1d) and isinstance(bn, nn.BatchNorm1d):
+            layers[i] = fuse_conv_bn_eval(conv, bn)
+            layers[i + 1] = nn.Identity()
+
+
+@torch.jit.script
+def _se_gate(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    # Scripted so that the sigmoid and multiplication are fused in one kernel
+    return x * torch.sigmoid(y)
+
+
+def _quantizable_groups(layers: nn.Sequential) -> List[List[str]]:
+    """Find the names of each convolution inside the sequential, together with
+    the batchnorm and relu that directly follow it, if present. On blocks that
+    were already fused, the identity left in place of the batchnorm is skipped.
+
+    Args:
+        layers: Sequential containing the layers
+
+    Returns:
+        List of groups of names, each group starting with a convolution.
+    """
+    groups = []
+    for i, layer in enumerate(layers):
+        if not isinstance(layer, nn.Conv1d):
+            continue
+        group = [str(i)]
+        j = i + 1
+        if j < len(layers) and isinstance(layers[j], MaskedBatchNorm1d):
+            group.append(f"{j}.layer")
+            j += 1
+        elif j < len(layers) and isinstance(layers[j], nn.Identity):
+            j += 1
+        if j < len(layers) and isinstance(layers[j], nn.ReLU):
+            group.append(str(j))
+        groups.append(group)
+    return groups
+
+
 class SqueezeExcite(nn.Module):
     def __init__(
         self,
@@ -59,14 +123,20 @@ class SqueezeExcite(nn.Module):
         """
         super(SqueezeExcite, self).__init__()
 
-        self.pool = nn.AdaptiveAvgPool1d(1)  # context window = T
-
         self.fc = nn.Sequential(
-            nn.Linear(channels, channels // reduction_ratio, bias=False),
+            nn.Conv1d(channels, channels // reduction_ratio, 1, bias=False),
             nn.ReLU(True),
-            nn.Linear(channels // reduction_ratio, channels, bias=False),
+            nn.Conv1d(channels // reduction_ratio, channels, 1, bias=False),
         )
 
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Compatibility with weights saved when the fc layers were nn.Linear,
+        # like the original nemo checkpoints
+        for key in (f"{prefix}fc.0.weight", f"{prefix}fc.2.weight"):
+            if key in state_dict and state_dict[key].dim() == 2:
+                state_dict[key] = state_dict[key].unsqueeze(-1)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         """
         Args:
@@ -74,13 +144,9 @@ class SqueezeExcite(nn.Module):
         Returns:
             Tensor of shape [batch, channels, time]
         """
-        y = self.pool(x)  # [B, C, T - context_window + 1]
-        y = y.transpose(1, -1)  # [B, T - context_window + 1, C]
-        y = self.fc(y)  # [B, T - context_window + 1, C]
-        y = y.transpose(1, -1)  # [B, C, T - context_window + 1]
-        y = torch.sigmoid(y)
-
-        return x * y
+        y = x.mean(dim=2, keepdim=True)  # [B, C, 1], context window = T
+        y = self.fc(y)  # [B, C, 1]
+        return _se_gate(x, y)
 
 
 class CitrinetBlock(nn.Module):
@@ -192,6 +258,21 @@ class CitrinetBlock(nn.Module):
         # compute the output
         return self.mout(out)
 
+    def fuse_for_inference(self) -> "CitrinetBlock":
+        """Fuse each convolution with the batchnorm that follows it, removing
+        one full pass over the activations per convolution. This only makes sense
+        for inference, so the block is put in eval mode and it shouldn't be trained
+        afterwards.
+
+        Returns:
+            The same block, with the layers fused inplace.
+        """
+        self.eval()
+        _fuse_conv_bn_sequential(self.mconv)
+        if self.res is not None:
+            _fuse_conv_bn_sequential(self.res)
+        return self
+
 
 def stem(feat_in: int) -> CitrinetBlock:
     """Creates the Citrinet stem. That is the first block of the model, that process the input directly.
@@ -276,3 +357,102 @@ def Citrinet_encoder(cfg: EncoderConfig) -> nn.Module:
         stem(cfg.feat_in),
         *body(cfg.filters, cfg.kernel_sizes, cfg.strides),
     )
+
+
+def fuse_encoder(encoder: nn.Module) -> nn.Module:
+    """Fuse the convolution and batchnorm layers of all the blocks inside the encoder.
+    Check [`CitrinetBlock.fuse_for_inference`][thunder.citrinet.blocks.CitrinetBlock.fuse_for_inference]
+
+    Args:
+        encoder: Encoder created by [`Citrinet_encoder`][thunder.citrinet.blocks.Citrinet_encoder]
+
+    Returns:
+        The same encoder, with the layers fused inplace and in eval mode.
+    """
+    encoder.eval()
+    for module in encoder.modules():
+        if isinstance(module, CitrinetBlock):
+            module.fuse_for_inference()
+    return encoder
+
+
+def optimize_encoder(encoder: nn.Module) -> torch.jit.ScriptModule:
+    """Fuses, scripts, freezes and optimizes the encoder for inference.
+    Freezing inlines the weights and buffers as constants, so that graph level
+    fusions can be applied.
+
+    Note:
+        The first calls to the optimized module are slower, so warm it up with an
+        input of the maximum expected length. Bucketing the inputs by length
+        avoids new specializations of the graph.
+
+    Args:
+        encoder: Encoder created by [`Citrinet_encoder`][thunder.citrinet.blocks.Citrinet_encoder],
+            with the weights already loaded.
+
+    Returns:
+        Optimized scripted module, only suitable for inference. The original
+        encoder is not modified.
+    """
+    encoder = fuse_encoder(deepcopy(encoder))
+    return torch.jit.optimize_for_inference(torch.jit.script(encoder))
+
+
+def quantize_encoder(
+    encoder: nn.Module,
+    calibration_data: Iterable[torch.Tensor],
+    backend: str = "fbgemm",
+) -> nn.Module:
+    """Post training static quantization of the encoder convolutions to int8.
+    Each convolution is fused with the following batchnorm and relu, then
+    quantized. The other operations (squeeze-excite, residual sum) are kept
+    in float, with the quantization done around each convolution. Only for
+    inference on cpu, the result can be scripted afterwards with torch.jit.script.
+
+    Args:
+        encoder: Encoder created by [`Citrinet_encoder`][thunder.citrinet.blocks.Citrinet_encoder]
+        calibration_data: Iterable of representative inputs of shape (batch, features, time),
+            used to calibrate the quantization ranges.
+        backend: Quantized engine to use. "fbgemm" for x86 and "qnnpack" for arm.
+            The previous torch.backends.quantized.engine is restored at the end.
+
+    Returns:
+        The same encoder, quantized inplace and in eval mode.
+    """
+    previous_engine = torch.backends.quantized.engine
+    torch.backends.quantized.engine = backend
+    try:
+        return _quantize_encoder(encoder, calibration_data, backend)
+    finally:
+        torch.backends.quantized.engine = previous_engine
+
+
+def _quantize_encoder(
+    encoder: nn.Module,
+    calibration_data: Iterable[torch.Tensor],
+    backend: str,
+) -> nn.Module:
+    encoder.eval()
+    qconfig = get_default_qconfig(backend)
+
+    blocks = [m for m in encoder.modules() if isinstance(m, CitrinetBlock)]
+    for block in blocks:
+        for layers in (block.mconv, block.res):
+            if layers is None:
+                continue
+            groups = _quantizable_groups(layers)
+            # Already fused blocks have no batchnorm left to fuse
+            to_fuse = [g for g in groups if len(g) > 1]
+            if to_fuse:
+                fuse_modules(layers, to_fuse, inplace=True)
+            for group in groups:
+                idx = int(group[0])
+                layers[idx] = QuantWrapper(layers[idx])
+                layers[idx].qconfig = qconfig
+
+    prepare(encoder, inplace=True)
+    with torch.no_grad():
+        for x in calibration_data:
+            encoder(x)
+    convert(encoder, inplace=True)
+    return encoder
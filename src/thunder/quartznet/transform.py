@@ -49,13 +49,16 @@ __all__ = [
     "PowerSpectrum",
     "MelScale",
     "FilterbankFeatures",
+    "optimize_filterbank",
 ]
 
 import math
+from copy import deepcopy
 from dataclasses import dataclass
 from typing import Optional
 
 import torch
+import torch.nn.functional as F
 from torch import nn
 from torchaudio.functional import create_fb_matrix
 
@@ -64,7 +67,13 @@ from thunder.blocks import convolution_stft
 
 class FeatureBatchNormalizer(nn.Module):
     def __init__(self):
-        """Normalize batch at the feature dimension."""
+        """Normalize batch at the feature dimension.
+
+        Note:
+            The padding (zeros) is excluded from both the mean and the variance.
+            Older versions included the padding in the variance, so models
+            trained with them can give slightly different results on padded batches.
+        """
         super().__init__()
         self.div_guard = 1e-5
 
@@ -74,17 +83,26 @@ class FeatureBatchNormalizer(nn.Module):
         Args:
             x : Tensor of shape (batch, features, time)
         """
-        mask = x.abs() > 0.0
-        num_elements = mask.sum(dim=2, keepdim=True).detach()
-        x_mean = x.sum(dim=2, keepdim=True).detach() / num_elements
-        numerator = (x - x_mean).pow(2).sum(dim=2, keepdim=True).detach()
-        x_std = (numerator / num_elements).sqrt()
+        mask = x != 0.0
+        num_elements = mask.sum(dim=2, keepdim=True).clamp_min(1)
+        # Both sums are computed in a single pass over the data,
+        # masked elements are zero so they don't contribute
+        x_sum = x.sum(dim=2, keepdim=True)
+        x_sq_sum = (x * x).sum(dim=2, keepdim=True)
+        x_mean = x_sum / num_elements
+        x_var = x_sq_sum / num_elements - x_mean * x_mean
         # make sure x_std is not zero
-        x_std += self.div_guard
+        x_std = x_var.clamp_min(0.0).sqrt() + self.div_guard
         result = (x - x_mean) / x_std
         return torch.masked_fill(result, ~mask, 0.0)
 
 
+@torch.jit.script
+def _dither(x: torch.Tensor, dither: float) -> torch.Tensor:
+    # Scripted so that the noise is sampled, scaled and masked in one kernel
+    return x + (x > 0.0).to(x.dtype) * (dither * torch.randn_like(x))
+
+
 class DitherAudio(nn.Module):
     def __init__(self, dither: float = 1e-5):
         """Add some dithering to the audio tensor.
@@ -106,8 +124,7 @@ class DitherAudio(nn.Module):
             x : Tensor of shape (batch, time)
         """
         if self.training:
-            mask = x > 0.0
-            return x + mask * (self.dither * torch.randn_like(x))
+            return _dither(x, self.dither)
         else:
             return x
 
@@ -133,9 +150,10 @@ class PreEmphasisFilter(nn.Module):
         Args:
             x : Tensor of shape (batch, time)
         """
-        return torch.cat(
-            (x[:, 0].unsqueeze(1), x[:, 1:] - self.preemph * x[:, :-1]), dim=1
-        )
+        # Shifting by zero padding keeps the first sample intact, and avoids
+        # the extra concatenation. Neither op is on the autocast lists, so the
+        # audio keeps its precision both in eager and scripted mode.
+        return torch.add(x, F.pad(x, (1, 0))[:, :-1], alpha=-self.preemph)
 
 
 class PowerSpectrum(nn.Module):
@@ -172,6 +190,16 @@ class PowerSpectrum(nn.Module):
         # before scripting. That way it works correctly when the export option
         # doesnt support fft, like mobile or onnx.
         self.stft_func = torch.stft
+        # Complex output is not supported by onnx, so
+        # patch_stft also disables it.
+        self.return_complex = True
+
+    def _apply(self, fn):
+        # Keep the window in float32 even when the module is converted
+        # to another dtype, so that it doesn't need to be cast every forward
+        super()._apply(fn)
+        self.window = self.window.float()
+        return self
 
     @torch.no_grad()
     def forward(self, x: torch.Tensor) -> torch.Tensor:
@@ -185,15 +213,16 @@ class PowerSpectrum(nn.Module):
             hop_length=self.hop_length,
             win_length=self.win_length,
             center=True,
-            window=self.window.to(dtype=torch.float),
-            return_complex=False,
+            window=self.window,
+            return_complex=self.return_complex,
         )
 
-        # torch returns real, imag; so convert to magnitude
-        x = torch.sqrt(x.pow(2).sum(-1))
-        # get power spectrum
-        x = x.pow(2.0)
-        return x
+        # The power spectrum is the squared magnitude,
+        # computed without the sqrt
+        if self.return_complex:
+            return torch.real(x).pow(2) + torch.imag(x).pow(2)
+        # Otherwise real, imag are stacked on the last dimension
+        return x.pow(2).sum(-1)
 
 
 class MelScale(nn.Module):
@@ -212,36 +241,38 @@ class MelScale(nn.Module):
         """
         super().__init__()
 
-        filterbanks = (
-            create_fb_matrix(
-                int(1 + n_fft // 2),
-                n_mels=nfilt,
-                sample_rate=sample_rate,
-                f_min=0,
-                f_max=sample_rate / 2,
-                norm="slaney",
-                mel_scale="slaney",
-            )
-            .transpose(0, 1)
-            .unsqueeze(0)
-        )
+        filterbanks = create_fb_matrix(
+            int(1 + n_fft // 2),
+            n_mels=nfilt,
+            sample_rate=sample_rate,
+            f_min=0,
+            f_max=sample_rate / 2,
+            norm="slaney",
+            mel_scale="slaney",
+        ).transpose(0, 1)
         self.register_buffer("fb", filterbanks)
         self.log_scale = log_scale
 
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Compatibility with checkpoints saved when the filterbank
+        # had an extra leading dimension
+        key = f"{prefix}fb"
+        if key in state_dict and state_dict[key].dim() == 3:
+            state_dict[key] = state_dict[key].squeeze(0)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
     @torch.no_grad()
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         """
         Args:
             x : Tensor of shape (batch, features, time)
         """
-        # dot with filterbank energies
-        x = torch.matmul(self.fb.to(x.dtype), x)
+        # dot with filterbank energies, fb is broadcasted over the batch
+        x = torch.matmul(self.fb, x)
         # log features
         # We want to avoid taking the log of zero
         if self.log_scale:
-            mask = x.abs() > 0.0
-            x = torch.log(x + 2 ** -24)
-            x[~mask] = 0.0
+            x = torch.log(x + 2 ** -24).masked_fill(x == 0.0, 0.0)
         return x
 
 
@@ -301,4 +332,26 @@ def patch_stft(filterbank: nn.Module) -> nn.Module:
         Layer with the stft operation patched.
     """
     filterbank[2].stft_func = convolution_stft
+    filterbank[2].return_complex = False
     return filterbank
+
+
+def optimize_filterbank(filterbank: nn.Module) -> torch.jit.ScriptModule:
+    """Scripts, freezes and optimizes the FilterbankFeatures for inference. That inlines
+    the small modules, constant folds the buffers and fuses the pointwise operations.
+    Dithering is disabled, because the optimized copy is put in eval mode.
+
+    Note:
+        If you want to use [`patch_stft`][thunder.quartznet.transform.patch_stft], apply it
+        before this function. The first calls to the optimized module are slower, so warm it up
+        using an input with the expected length before measuring or serving.
+
+    Args:
+        filterbank : the FilterbankFeatures layer to be optimized
+
+    Returns:
+        Optimized scripted module, only suitable for inference. The original
+        filterbank is not modified.
+    """
+    filterbank = deepcopy(filterbank).eval()
+    return torch.jit.optimize_for_inference(torch.jit.script(filterbank))
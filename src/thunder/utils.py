@@ -13,20 +13,65 @@ __all__ = [
     "default_list",
 ]
 
-import functools
 import os
-from copy import copy
+import shutil
+import struct
 from dataclasses import field
 from enum import Enum
 from pathlib import Path
-from typing import Callable, List, TypeVar, Union
+from typing import Callable, List, Optional, TypeVar, Union
+from urllib.request import urlopen
 
 import torchaudio
-import wget
+
+# PCM, IEEE float and WAVE_FORMAT_EXTENSIBLE, where each block is one frame
+_WAV_FRAME_FORMATS = (0x0001, 0x0003, 0xFFFE)
+
+
+def _wav_len(item: Union[Path, str]) -> Optional[float]:
+    """Reads the length of a wav file directly from the RIFF header.
+
+    Args:
+        item : Audio path
+
+    Returns:
+        Lenght in seconds of the audio, or None if the file is not a
+        wav that can be handled by only reading the header.
+    """
+    with open(item, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt " and size >= 16:
+                fmt_data = f.read(14)
+                if len(fmt_data) < 14:
+                    return None
+                fmt = struct.unpack("<HHIIH", fmt_data)
+                f.seek(size - 14 + size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                audio_format, _, sample_rate, _, block_align = fmt
+                if audio_format not in _WAV_FRAME_FORMATS or block_align == 0:
+                    return None
+                # Streamed files may not have the data size filled
+                if size in (0, 0xFFFFFFFF) or sample_rate == 0:
+                    return None
+                return (size // block_align) / sample_rate
+            else:
+                # Chunks are word aligned
+                f.seek(size + size % 2, os.SEEK_CUR)
 
 
 def audio_len(item: Union[Path, str]) -> float:
-    """Returns the length of the audio file
+    """Returns the length of the audio file. For wav files
+    only the header is parsed, without calling any audio backend.
 
     Args:
         item : Audio path
@@ -34,6 +79,9 @@ def audio_len(item: Union[Path, str]) -> float:
     Returns:
         Lenght in seconds of the audio
     """
+    length = _wav_len(item)
+    if length is not None:
+        return length
     metadata = torchaudio.info(item)
     return metadata.num_frames / metadata.sample_rate
 
@@ -60,9 +108,21 @@ def get_files(directory: Union[str, Path], extension: str) -> List[Path]:
         List of all the files that match the extension
     """
     files_found = []
+    directories = [directory]
 
-    for root, _, files in os.walk(directory, followlinks=True):
-        files_found += [Path(root) / f for f in files if f.endswith(extension)]
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except OSError:
+            # Same as os.walk, ignore directories that can't be listed
+            continue
+        with entries:
+            for entry in entries:
+                # Symlinks to directories are followed
+                if entry.is_dir():
+                    directories.append(entry.path)
+                elif entry.name.endswith(extension):
+                    files_found.append(Path(entry.path))
     return files_found
 
 
@@ -83,11 +143,10 @@ def chain_calls(*funcs: List[Callable]) -> Callable:
         Single chained function
     """
 
-    def call(x, f):
-        return f(x)
-
     def _inner(arg):
-        return functools.reduce(call, funcs, arg)
+        for f in funcs:
+            arg = f(arg)
+        return arg
 
     return _inner
 
@@ -131,7 +190,18 @@ def download_checkpoint(name: BaseCheckpoint, checkpoint_folder: str = None) ->
     filename = url.split("/")[-1]
     checkpoint_path = Path(checkpoint_folder) / filename
     if not checkpoint_path.exists():
-        wget.download(url, out=str(checkpoint_path))
+        # Download to a temporary file first, so that an interrupted
+        # download never leaves a corrupted checkpoint behind
+        partial_path = checkpoint_path.with_suffix(checkpoint_path.suffix + ".part")
+        print(f"Downloading {url} to {checkpoint_path}")
+        try:
+            with urlopen(url) as response, open(partial_path, "wb") as f:
+                shutil.copyfileobj(response, f, 1 << 20)
+        except BaseException:
+            if partial_path.exists():
+                partial_path.unlink()
+            raise
+        partial_path.replace(checkpoint_path)
 
     return checkpoint_path
 
@@ -148,4 +218,4 @@ def default_list(elements: List[T]) -> List[T]:
     Returns:
         field compatible with the way dataclasses handle mutable defaults
     """
-    return field(default_factory=lambda: copy(elements))
+    return field(default_factory=lambda elems=tuple(elements): list(elems))
@@ -3,6 +3,7 @@
 
 # Copyright (c) 2021 scart97
 
+from copy import deepcopy
 from tempfile import TemporaryDirectory
 
 import torch
@@ -16,7 +17,15 @@ from tests.utils import (
     mark_slow,
     requirescuda,
 )
-from thunder.citrinet.blocks import CitrinetBlock, SqueezeExcite
+from thunder.citrinet.blocks import (
+    Citrinet_encoder,
+    CitrinetBlock,
+    EncoderConfig,
+    SqueezeExcite,
+    fuse_encoder,
+    optimize_encoder,
+    quantize_encoder,
+)
 
 
 def test_squeezeexcite_retains_shape():
@@ -72,6 +81,18 @@ def test_squeezeexcite_script():
     assert torch.allclose(se_script(x), se(x))
 
 
+def test_squeezeexcite_load_linear_weights():
+    se = SqueezeExcite(128, 4)
+    # Weights in the old format, where the fc layers were nn.Linear
+    state_dict = {
+        "fc.0.weight": torch.randn(32, 128),
+        "fc.2.weight": torch.randn(128, 32),
+    }
+    se.load_state_dict(state_dict, strict=True)
+    assert torch.allclose(se.fc[0].weight.squeeze(-1), state_dict["fc.0.weight"])
+    assert torch.allclose(se.fc[2].weight.squeeze(-1), state_dict["fc.2.weight"])
+
+
 citrinet_parameters = given(
     in_channels=integers(16, 32),
     out_channels=integers(16, 32),
@@ -195,3 +216,96 @@ def test_CitrinetBlock_onnx(**kwargs):
             verbose=True,
             opset_version=11,
         )
+
+
+@citrinet_parameters
+@settings(deadline=None)
+def test_CitrinetBlock_fuse_same_output(**kwargs):
+    try:
+        block = CitrinetBlock(**kwargs)
+    except ValueError:
+        return
+    x = torch.randn(10, kwargs["in_channels"], 1337)
+    # Update the batchnorm running statistics
+    block.train()
+    block(x)
+    block.eval()
+
+    fused = deepcopy(block).fuse_for_inference()
+    assert not any(isinstance(m, torch.nn.BatchNorm1d) for m in fused.modules())
+    assert torch.allclose(block(x), fused(x), atol=1e-5)
+
+
+def _small_encoder():
+    encoder = Citrinet_encoder(
+        EncoderConfig(filters=[64, 64], kernel_sizes=[11, 13], strides=[1, 2])
+    )
+    x = torch.randn(2, 80, 137)
+    # Update the batchnorm running statistics
+    encoder.train()
+    encoder(x)
+    encoder.eval()
+    return encoder, x
+
+
+def test_fuse_encoder():
+    encoder, x = _small_encoder()
+
+    fused = fuse_encoder(deepcopy(encoder))
+    assert not fused.training
+    assert torch.allclose(encoder(x), fused(x), atol=1e-4)
+    fused_script = torch.jit.script(fused)
+    assert torch.allclose(fused(x), fused_script(x))
+
+
+def test_optimize_encoder():
+    encoder, x = _small_encoder()
+    out1 = encoder(x)
+
+    optimized = optimize_encoder(encoder)
+    out2 = optimized(x)
+    assert torch.allclose(out1, out2, atol=1e-4)
+    # The original encoder is kept intact
+    assert any(isinstance(m, torch.nn.BatchNorm1d) for m in encoder.modules())
+
+
+def _assert_quantized_close(encoder, quantized, x):
+    out1 = encoder(x)
+    out2 = quantized(x)
+    assert out1.shape == out2.shape
+    similarity = torch.nn.functional.cosine_similarity(
+        out1.flatten(), out2.flatten(), dim=0
+    )
+    assert similarity > 0.95
+    relative_error = (out1 - out2).norm() / out1.norm()
+    assert relative_error < 0.3
+
+
+def test_quantize_encoder():
+    encoder, x = _small_encoder()
+
+    quantized = quantize_encoder(deepcopy(encoder), [x])
+    assert not any(isinstance(m, torch.nn.BatchNorm1d) for m in quantized.modules())
+    _assert_quantized_close(encoder, quantized, x)
+    quantized_script = torch.jit.script(quantized)
+    assert torch.allclose(quantized(x), quantized_script(x))
+
+
+def test_quantize_fused_encoder():
+    encoder, x = _small_encoder()
+
+    fused = fuse_encoder(deepcopy(encoder))
+    quantized = quantize_encoder(fused, [x])
+    # The relu's are still fused with the convolutions
+    assert any(
+        isinstance(m, torch.nn.intrinsic.quantized.ConvReLU1d)
+        for m in quantized.modules()
+    )
+    _assert_quantized_close(encoder, quantized, x)
+
+
+def test_quantize_encoder_restores_engine():
+    encoder, x = _small_encoder()
+    previous_engine = torch.backends.quantized.engine
+    quantize_encoder(encoder, [x])
+    assert torch.backends.quantized.engine == previous_engine
@@ -26,6 +26,7 @@ from thunder.quartznet.transform import (
     MelScale,
     PowerSpectrum,
     PreEmphasisFilter,
+    optimize_filterbank,
     patch_stft,
 )
 
@@ -50,6 +51,15 @@ def test_normalize_has_correct_mean_std():
         assert torch.allclose(xb[:, :].std(), torch.ones(1), atol=0.1)
 
 
+def test_normalize_ignores_padding():
+    norm = FeatureBatchNormalizer()
+    x = torch.randn(10, 40, 1337)
+    padded = torch.cat([x, torch.zeros(10, 40, 100)], dim=2)
+    out = norm(padded)
+    assert torch.allclose(out[:, :, :1337], norm(x), atol=1e-5)
+    assert (out[:, :, 1337:] == 0.0).all()
+
+
 @requirescuda
 def test_normalize_device_move():
     norm = FeatureBatchNormalizer()
@@ -195,6 +205,39 @@ def test_preemph_filter_changes_input(preemph):
     assert not torch.allclose(out, x)
 
 
+@preemph_params
+def test_preemph_filter_expected_output(preemph):
+    filt = PreEmphasisFilter(preemph)
+    for dtype in [torch.float, torch.double]:
+        x = torch.randn(10, 1337, dtype=dtype)
+        expected = torch.cat((x[:, :1], x[:, 1:] - preemph * x[:, :-1]), dim=1)
+        out = filt(x)
+        assert out.dtype == dtype
+        assert torch.allclose(out, expected, atol=1e-6)
+
+
+@requirescuda
+def test_preemph_filter_autocast_keeps_precision():
+    filt = PreEmphasisFilter(0.97).cuda()
+    x = torch.randn(10, 1337, device="cuda")
+    expected = torch.cat((x[:, :1], x[:, 1:] - 0.97 * x[:, :-1]), dim=1)
+    with torch.cuda.amp.autocast():
+        out = filt(x)
+    assert out.dtype == torch.float
+    assert torch.allclose(out, expected, atol=1e-6)
+
+
+@requirescuda
+def test_preemph_filter_script_autocast_keeps_precision():
+    filt = torch.jit.script(PreEmphasisFilter(0.97).cuda())
+    x = torch.randn(10, 1337, device="cuda")
+    expected = torch.cat((x[:, :1], x[:, 1:] - 0.97 * x[:, :-1]), dim=1)
+    with torch.cuda.amp.autocast():
+        out = filt(x)
+    assert out.dtype == torch.float
+    assert torch.allclose(out, expected, atol=1e-6)
+
+
 @requirescuda
 @preemph_params
 def test_preemph_filter_device_move(preemph):
@@ -264,6 +307,24 @@ def test_powerspec_raises(**kwargs):
         PowerSpectrum(**kwargs)
 
 
+def test_powerspectrum_window_stays_float():
+    spec = PowerSpectrum()
+    spec.half()
+    assert spec.window.dtype == torch.float
+    spec.double()
+    assert spec.window.dtype == torch.float
+
+
+@powerspec_params
+def test_powerspectrum_real_output_same_as_complex(**kwargs):
+    spec = PowerSpectrum(**kwargs)
+    x = torch.randn(10, 1337)
+    out1 = spec(x)
+    spec.return_complex = False
+    out2 = spec(x)
+    assert torch.allclose(out1, out2, atol=1e-5)
+
+
 @requirescuda
 @powerspec_params
 def test_powerspectrum_device_move(**kwargs):
@@ -304,6 +365,7 @@ def test_powerspectrum_onnx(**kwargs):
     # https://github.com/onnx/onnx/pull/2625
     spec = PowerSpectrum(**kwargs)
     spec.stft_func = convolution_stft
+    spec.return_complex = False
     spec.eval()
     x = torch.randn(10, 1337)
 
@@ -343,6 +405,14 @@ def test_melscale_zero_guard(**kwargs):
     assert torch.isfinite(out).all()
 
 
+def test_melscale_load_old_filterbank_shape():
+    mel = MelScale(sample_rate=16000, n_fft=512, nfilt=64)
+    state_dict = {"fb": torch.randn(1, 64, 257)}
+    mel.load_state_dict(state_dict, strict=True)
+    assert mel.fb.shape == (64, 257)
+    assert torch.allclose(mel.fb, state_dict["fb"][0])
+
+
 @requirescuda
 @melscale_params
 def test_melscale_device_move(**kwargs):
@@ -419,6 +489,23 @@ def test_patch_stft_similar_output():
     assert torch.allclose(out1, out2, atol=1e-3)
 
 
+def test_optimize_filterbank_similar_output():
+    fb = FilterbankFeatures(FilterbankConfig())
+    fb.eval()
+    x = torch.randn(10, 1000)
+    out1 = fb(x)
+    fb_optimized = optimize_filterbank(fb)
+    out2 = fb_optimized(x)
+    assert torch.allclose(out1, out2, atol=1e-4)
+
+
+def test_optimize_filterbank_keeps_original_mode():
+    fb = FilterbankFeatures(FilterbankConfig())
+    fb.train()
+    optimize_filterbank(fb)
+    assert all(m.training for m in fb.modules())
+
+
 @requirescuda
 @filterbank_params
 @settings(deadline=None)
@@ -2,7 +2,13 @@ import torch
 from pytorch_lightning import seed_everything
 
 from tests.utils import requirescuda
-from thunder.blocks import _fourier_matrix, convolution_stft
+from thunder.blocks import (
+    Conv1dChannelsLast,
+    _fourier_matrix,
+    convert_to_channels_last,
+    convolution_stft,
+)
+from thunder.citrinet.blocks import CitrinetBlock
 
 
 def test_fourier_transform_matrix():
@@ -25,6 +31,30 @@ def test_convolution_stft():
     assert torch.allclose(stft, out_original, atol=1e-2)
 
 
+def test_convolution_stft_complex():
+    x = torch.randn(10, 1000)
+    window_tensor = torch.hann_window(256, periodic=False)
+
+    stft = convolution_stft(
+        x,
+        n_fft=1024,
+        hop_length=512,
+        win_length=256,
+        window=window_tensor,
+        return_complex=True,
+    )
+    out_original = torch.stft(
+        x,
+        n_fft=1024,
+        hop_length=512,
+        win_length=256,
+        window=window_tensor,
+        return_complex=True,
+    )
+    assert stft.is_complex()
+    assert torch.allclose(stft, out_original, atol=1e-2)
+
+
 @requirescuda
 def test_convolution_stft_device_move():
     x = torch.randn(10, 1000)
@@ -46,3 +76,29 @@ def test_convolution_stft_device_move():
     outputs_gpu = apply_op(x.cuda())
 
     assert torch.allclose(outputs_cpu, outputs_gpu.cpu(), atol=1e-3)
+
+
+def test_convert_to_channels_last_same_output():
+    block = CitrinetBlock(32, 64, repeat=2, stride=(2,), separable=True)
+    block.eval()
+    x = torch.randn(4, 32, 137)
+    out1 = block(x)
+
+    block = convert_to_channels_last(block)
+    assert not any(isinstance(m, torch.nn.Conv1d) for m in block.modules())
+    out2 = block(x)
+    assert out1.shape == out2.shape
+    assert torch.allclose(out1, out2, atol=1e-5)
+
+    block_script = torch.jit.script(block)
+    assert torch.allclose(out2, block_script(x), atol=1e-5)
+
+
+def test_convert_to_channels_last_string_padding():
+    for padding in ["same", "valid"]:
+        conv = torch.nn.Conv1d(16, 16, kernel_size=5, padding=padding, groups=16)
+        x = torch.randn(4, 16, 137)
+        out1 = conv(x)
+        out2 = Conv1dChannelsLast.from_conv1d(conv)(x)
+        assert out1.shape == out2.shape
+        assert torch.allclose(out1, out2, atol=1e-5)
@@ -3,9 +3,20 @@
 
 # Copyright (c) 2021 scart97
 
+import struct
 from pathlib import Path
 
-from thunder.utils import audio_len, chain_calls, get_default_cache_folder, get_files
+import pytest
+
+import torchaudio
+
+from thunder.utils import (
+    _wav_len,
+    audio_len,
+    chain_calls,
+    get_default_cache_folder,
+    get_files,
+)
 
 
 def test_audio_len(sample_data):
@@ -15,6 +26,63 @@ def test_audio_len(sample_data):
     assert isinstance(audio_length, float)
 
 
+def test_audio_len_same_as_torchaudio(sample_data):
+    audio_files = get_files(sample_data, ".wav")
+    metadata = torchaudio.info(audio_files[0])
+    expected = metadata.num_frames / metadata.sample_rate
+    assert audio_len(audio_files[0]) == pytest.approx(expected)
+
+
+def _chunk(chunk_id: bytes, data: bytes, size: int = None) -> bytes:
+    size = len(data) if size is None else size
+    return struct.pack("<4sI", chunk_id, size) + data + b"\0" * (len(data) % 2)
+
+
+def _write_wav(path: Path, *chunks: bytes) -> Path:
+    body = b"WAVE" + b"".join(chunks)
+    path.write_bytes(b"RIFF" + struct.pack("<I", len(body)) + body)
+    return path
+
+
+# PCM, mono, 16kHz, 16 bits
+_fmt_chunk = _chunk(b"fmt ", struct.pack("<HHIIHH", 1, 1, 16000, 32000, 2, 16))
+
+
+def test_wav_len_from_header(tmp_path):
+    wav = _write_wav(tmp_path / "a.wav", _fmt_chunk, _chunk(b"data", b"\0" * 32000))
+    assert _wav_len(wav) == pytest.approx(1.0)
+
+
+def test_wav_len_chunk_before_fmt(tmp_path):
+    wav = _write_wav(
+        tmp_path / "a.wav",
+        _chunk(b"LIST", b"INFOabc"),
+        _fmt_chunk,
+        _chunk(b"data", b"\0" * 16000),
+    )
+    assert _wav_len(wav) == pytest.approx(0.5)
+
+
+def test_wav_len_not_wav(tmp_path):
+    not_wav = tmp_path / "a.txt"
+    not_wav.write_text("this is not a wav file")
+    assert _wav_len(not_wav) is None
+
+
+def test_wav_len_streamed_size(tmp_path):
+    for size in [0, 0xFFFFFFFF]:
+        wav = _write_wav(
+            tmp_path / "a.wav", _fmt_chunk, _chunk(b"data", b"\0" * 100, size=size)
+        )
+        assert _wav_len(wav) is None
+
+
+def test_wav_len_truncated_fmt(tmp_path):
+    wav = tmp_path / "a.wav"
+    wav.write_bytes(b"RIFF" + struct.pack("<I", 20) + b"WAVE" + _fmt_chunk[:14])
+    assert _wav_len(wav) is None
+
+
 def test_get_default_cache_folder():
     path = get_default_cache_folder()
     assert path.exists()